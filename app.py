@@ -1,98 +1,53 @@
 # app.py (product + per-product template + leg-based payoff composition)
 import streamlit as st
-from docx import Document
 import io
+import copy
 import datetime
+import hashlib
+from termsheet.pricing import combined_payoff, legs_to_arrays, round_cents
+from termsheet.scenario import format_columns, spot_grid
 
 st.set_page_config(page_title="Term Sheet Generator", layout="wide")
 st.title("Term Sheet Generator — Word template + Scenario Table (product-aware)")
 
-# -------------------- helper functions (same as your earlier version) --------------------
-
-def replace_text_in_paragraphs_full(doc, placeholder, replacement):
-    for para in doc.paragraphs:
-        if placeholder in para.text:
-            new_text = para.text.replace(placeholder, str(replacement))
-            para.clear()
-            para.add_run(new_text)
-
-def replace_text_in_cell_paragraphs_full(cell, placeholder, replacement):
-    for para in cell.paragraphs:
-        if placeholder in para.text:
-            new_text = para.text.replace(placeholder, str(replacement))
-            para.clear()
-            para.add_run(new_text)
-
-def replace_text_in_tables_full(doc, placeholder, replacement):
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                replace_text_in_cell_paragraphs_full(cell, placeholder, replacement)
-
-def replace_in_headers_and_footers(doc, placeholder, replacement):
-    for section in doc.sections:
-        header = section.header
-        footer = section.footer
-        for para in header.paragraphs:
-            if placeholder in para.text:
-                new_text = para.text.replace(placeholder, str(replacement))
-                para.clear()
-                para.add_run(new_text)
-        for table in header.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    replace_text_in_cell_paragraphs_full(cell, placeholder, replacement)
-        for para in footer.paragraphs:
-            if placeholder in para.text:
-                new_text = para.text.replace(placeholder, str(replacement))
-                para.clear()
-                para.add_run(new_text)
-        for table in footer.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    replace_text_in_cell_paragraphs_full(cell, placeholder, replacement)
-
-def find_paragraph_with_placeholder(doc, placeholder):
-    for para in doc.paragraphs:
-        if placeholder in para.text:
-            return para
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    if placeholder in para.text:
-                        return para
-    for section in doc.sections:
-        for para in section.header.paragraphs:
-            if placeholder in para.text:
-                return para
-        for para in section.footer.paragraphs:
-            if placeholder in para.text:
-                return para
-    return None
-
-def insert_table_after_paragraph(doc, paragraph, data, col_names=None, preferred_style_name="Table Grid"):
-    nrows = len(data) + (1 if col_names else 0)
-    ncols = len(data[0]) if data else (len(col_names) if col_names else 1)
-    table = doc.add_table(rows=nrows, cols=ncols)
-    try:
-        table.style = preferred_style_name
-    except Exception:
-        pass
-    row_idx = 0
-    if col_names:
-        hdr_cells = table.rows[row_idx].cells
-        for c, name in enumerate(col_names):
-            hdr_cells[c].text = str(name)
-        row_idx += 1
-    for r, row in enumerate(data):
-        cells = table.rows[row_idx + r].cells
-        for c, val in enumerate(row):
-            cells[c].text = str(val)
-    try:
-        paragraph._p.addnext(table._tbl)
-    except Exception:
-        st.warning("Could not insert table at the placeholder location; table appended at the end.")
+# -------------------- template cache --------------------
+
+@st.cache_resource(max_entries=4)
+def load_template(digest, _raw):
+    # parsed once per distinct upload (keyed by content digest; streamlit skips hashing `_raw`).
+    # callers must deep-copy the result before filling in placeholders.
+    # python-docx (and lxml under it) is imported lazily: the UI renders without it until a
+    # term sheet is actually generated.
+    from docx import Document
+    return Document(io.BytesIO(_raw))
+
+@st.cache_resource(max_entries=8)
+def render_text_stage(digest, text_replacements, _raw):
+    # template with every text placeholder (body, tables, headers and footers) replaced in one pass.
+    # keyed by template digest + placeholder values; callers must deep-copy it before adding the table.
+    from termsheet.docx_utils import replace_placeholders
+    doc = copy.deepcopy(load_template(digest, _raw))
+    replace_placeholders(doc, dict(text_replacements))
+    return doc
+
+def template_digest(raw):
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+# -------------------- scenario table cache --------------------
+
+@st.cache_data(max_entries=16)
+def scenario_table_xml(grid, leg_strikes, leg_mults, leg_kinds, notional, col_names, layout):
+    # the scenario <w:tbl> markup, rebuilt only when the legs, grid, notional or the template's
+    # table layout change -- editing the client name, dates or product reuses it as is
+    from termsheet.docx_utils import table_xml
+    spots = spot_grid(*grid)
+    # rows: Spot at maturity, Payoff (sum of legs), and an optional scaled P&L by notional
+    payoff = combined_payoff(spots, leg_strikes, leg_mults, leg_kinds)
+    # if you prefer scaled by notional multiply here; we include both unscaled and scaled
+    payoff_scaled = round_cents(payoff * (notional / 1.0))
+    rows = [list(col_names)] + format_columns([spots, payoff, payoff_scaled])
+    style_id, col_width = layout
+    return table_xml(rows, len(col_names), col_width, style_id)
 
 # -------------------- UI & inputs --------------------
 
@@ -151,6 +106,9 @@ with st.expander("Define legs (up to 4)", expanded=True):
         leg_mult = st.number_input(f"Multiplier / notional factor (leg {i+1})", value=1.0, step=0.1, key=f"leg_mult_{i}", format="%.2f")
         legs.append({"type": leg_type, "strike": float(leg_strike), "mult": float(leg_mult)})
 
+# legs as parallel arrays (strikes / multipliers / int8 kind codes) for the payoff kernels
+leg_strikes, leg_mults, leg_kinds = legs_to_arrays(legs)
+
 # -------------------- template selection logic --------------------
 
 # choose the product template if provided, else fall back to general template
@@ -171,94 +129,56 @@ st.write("Legs:")
 for i, leg in enumerate(legs):
     st.write(f"- Leg {i+1}: {leg['type']} @ {leg['strike']:.2f} × {leg['mult']:.2f}")
 
-# -------------------- payoff calculators --------------------
-
-def payoff_call(spot_val, K):
-    return max(0.0, spot_val - K)
-
-def payoff_put(spot_val, K):
-    return max(0.0, K - spot_val)
-
-def payoff_forward(spot_val, K):
-    # linear forward payoff (spot - strike)
-    return spot_val - K
-
-def combined_payoff(spot_val, legs_list):
-    total = 0.0
-    for lg in legs_list:
-        if lg["type"] == "Call":
-            total += lg["mult"] * payoff_call(spot_val, lg["strike"])
-        elif lg["type"] == "Put":
-            total += lg["mult"] * payoff_put(spot_val, lg["strike"])
-        elif lg["type"] == "Forward":
-            total += lg["mult"] * payoff_forward(spot_val, lg["strike"])
-    return round(total, 2)
+# -------------------- placeholders --------------------
+
+# text placeholder values; as a tuple they are also the cache key of render_text_stage
+placeholders = {
+    "{{ClientName}}": client_name,
+    "{{ValuationDate}}": valuation_date.isoformat(),
+    "{{MaturityDate}}": maturity_date.isoformat(),
+    "{{Strike}}": f"{strike:.2f}",
+    "{{Spot}}": f"{spot:.2f}",
+    "{{Premium}}": f"{premium:.4f}",
+    "{{Notional}}": f"{notional:,.2f}",
+    "{{ImpliedVol}}": f"{implied_vol:.2f}%",
+    "{{Product}}": product,
+}
 
 # -------------------- Generate term sheet button --------------------
 
 if st.button("Generate Term Sheet"):
+    from termsheet.docx_utils import find_paragraph_with_placeholder, insert_table_xml, replace_in_paragraph, save_docx, table_layout
 
-    # load document
+    # load document with the text placeholders already filled in (cached per template + values);
+    # only the scenario table below is rebuilt when just the legs or the grid change
     try:
-        template_doc = Document(template_file)
+        raw = template_file.getvalue()
+        template_doc = copy.deepcopy(render_text_stage(template_digest(raw), tuple(placeholders.items()), raw))
     except Exception as e:
         st.error(f"Failed to read the uploaded docx template: {e}")
         st.stop()
 
-    # scenario spots
-    spots = []
-    val = float(min_spot)
-    max_sp = float(max_spot)
+    # scenario table (cached per legs / grid / notional / table layout)
     s_step = float(step_spot) if step_spot > 0 else 1.0
-    while val <= max_sp + 1e-9:
-        spots.append(round(val, 2))
-        val += s_step
-
-    # build scenario table rows: Spot at maturity, Payoff (sum of legs), and an optional scaled P&L by notional
-    scenario_rows = []
-    for s in spots:
-        payoff = combined_payoff(s, legs)
-        # if you prefer scaled by notional multiply here; we include both unscaled and scaled
-        payoff_scaled = round(payoff * (notional / 1.0), 2)
-        scenario_rows.append([s, payoff, payoff_scaled])
-
-    # placeholders formatting
-    placeholders = {
-        "{{ClientName}}": client_name,
-        "{{ValuationDate}}": valuation_date.strftime("%Y-%m-%d"),
-        "{{MaturityDate}}": maturity_date.strftime("%Y-%m-%d"),
-        "{{Strike}}": "{:.2f}".format(strike),
-        "{{Spot}}": "{:.2f}".format(spot),
-        "{{Premium}}": "{:.4f}".format(premium),
-        "{{Notional}}": "{:,.2f}".format(notional),
-        "{{ImpliedVol}}": "{:.2f}%".format(implied_vol),
-        "{{Product}}": product,
-    }
-
-    # replace placeholders everywhere
-    for ph, val in placeholders.items():
-        replace_text_in_paragraphs_full(template_doc, ph, val)
-        replace_text_in_tables_full(template_doc, ph, val)
-        replace_in_headers_and_footers(template_doc, ph, val)
+    col_names = ("Spot at Maturity", "Payoff (per unit)", f"Payoff × Notional ({notional:,.2f})")
+    tbl_xml = scenario_table_xml(
+        (float(min_spot), float(max_spot), s_step), leg_strikes, leg_mults, leg_kinds,
+        float(notional), col_names, table_layout(template_doc, len(col_names)),
+    )
 
     # insert scenario table at placeholder or append
     placeholder = "{{ScenarioTable}}"
     para = find_paragraph_with_placeholder(template_doc, placeholder)
-    col_names = ["Spot at Maturity", "Payoff (per unit)", f"Payoff × Notional ({notional:,.2f})"]
     if para:
-        if placeholder in para.text:
-            new_text = para.text.replace(placeholder, "")
-            para.clear()
-            para.add_run(new_text)
-        insert_table_after_paragraph(template_doc, para, scenario_rows, col_names=col_names)
+        replace_in_paragraph(para, {placeholder: ""})
+        insert_table_xml(template_doc, para, tbl_xml)
     else:
-        insert_table_after_paragraph(template_doc, template_doc.paragraphs[-1], scenario_rows, col_names=col_names)
+        insert_table_xml(template_doc, None, tbl_xml)
         st.info("Placeholder {{ScenarioTable}} not found — scenario table appended at document end.")
 
     # Save and provide download
     output = io.BytesIO()
-    template_doc.save(output)
-    output.seek(0)
+    save_docx(template_doc, raw, output)
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     safe_client = client_name.replace(" ", "_")
     filename = f"TermSheet_{product}_{safe_client}_{timestamp}.docx"
@@ -266,7 +186,7 @@ if st.button("Generate Term Sheet"):
     st.success("Document ready — click the button below to download.")
     st.download_button(
         label="Download Term Sheet (.docx)",
-        data=output.getvalue(),
+        data=output,  # streamlit rewinds and reads the BytesIO itself, so no seek(0)/getvalue() here
         file_name=filename,
         mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     )
@@ -0,0 +1 @@
+# termsheet: document and pricing helpers behind the Streamlit app (app.py only drives the UI)
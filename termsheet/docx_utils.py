@@ -0,0 +1,174 @@
+# termsheet/docx_utils.py (placeholder replacement + scenario table insertion for .docx templates)
+import io
+import re
+import zipfile
+from bisect import bisect_right
+from itertools import accumulate
+from xml.sax.saxutils import escape as xml_escape
+
+from docx.enum.style import WD_STYLE_TYPE
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, nsmap, qn
+from docx.shared import Emu
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+W_P = qn("w:p")
+W_T = qn("w:t")
+
+# placeholders are always {{Name}} tokens, so one generic scan finds all of them in a single
+# left-to-right pass, no matter how many keys are being replaced
+_PLACEHOLDER_RE = re.compile(r"\{\{\w+\}\}")
+
+def _set_text(t, text):
+    t.text = text
+    if text != text.strip():
+        t.set(qn("xml:space"), "preserve")
+
+_HEADER_FOOTER_RELS = (RT.HEADER, RT.FOOTER)
+
+def _text_parts(doc):
+    # document part plus every header/footer part (default, first-page and even-page), each once.
+    # read off the document part's relationships, so no section proxies are built and
+    # no empty header definition gets created for a template that has none.
+    # a part referenced by more than one relationship is still walked only once.
+    yield doc.part
+    seen = set()
+    for rel in doc.part.rels.values():
+        if rel.reltype in _HEADER_FOOTER_RELS and not rel.is_external and rel.target_part not in seen:
+            seen.add(rel.target_part)
+            yield rel.target_part
+
+# paragraphs whose text contains "{{" (or a given placeholder), selected by lxml's C XPath engine
+# rather than by building a python-docx Paragraph wrapper for every paragraph. string(.) is the
+# concatenated text of all runs, so placeholders split across runs are still found.
+_CANDIDATE_PARAGRAPHS = etree.XPath('.//w:p[contains(string(.), "{{")]', namespaces={"w": nsmap["w"]})
+# innermost match only: a paragraph holding a text box also contains the text box's paragraphs' text
+_PARAGRAPHS_CONTAINING = etree.XPath(
+    ".//w:p[contains(string(.), $text) and not(.//w:p[contains(string(.), $text)])]",
+    namespaces={"w": nsmap["w"]},
+)
+
+def _own_text_nodes(p):
+    # <w:t> atoms of paragraph `p`, in order. atoms of a paragraph nested inside it (a text box)
+    # belong to that nested paragraph instead.
+    return [t for t in p.iter(W_T) if next(t.iterancestors(W_P)) is p]
+
+def _replace_in_text_nodes(nodes, values):
+    # substitute every known {{Name}} in one paragraph, rewriting only the atoms a placeholder spans.
+    # a placeholder inside one atom is replaced in place; one split across atoms is written into its
+    # first atom, the atoms in between are emptied and the last keeps what follows the placeholder.
+    # sibling runs, and the formatting of every run, are left untouched.
+    texts = [t.text or "" for t in nodes]  # each atom's text is read exactly once
+    joined = "".join(texts)
+    if "{{" not in joined:
+        return
+    matches = [m for m in _PLACEHOLDER_RE.finditer(joined) if m.group(0) in values]
+    if not matches:
+        return
+    starts = list(accumulate([0] + [len(x) for x in texts[:-1]]))
+    new_texts = list(texts)
+    # right to left, so each edit only changes text after the offsets still to be used
+    for m in reversed(matches):
+        first = bisect_right(starts, m.start()) - 1
+        last = bisect_right(starts, m.end() - 1) - 1
+        head = new_texts[first][:m.start() - starts[first]]
+        tail = new_texts[last][m.end() - starts[last]:]
+        if first == last:
+            new_texts[first] = head + values[m.group(0)] + tail
+        else:
+            new_texts[first] = head + values[m.group(0)]
+            for i in range(first + 1, last):
+                new_texts[i] = ""
+            new_texts[last] = tail
+    for t, old_text, new_text in zip(nodes, texts, new_texts):
+        if new_text != old_text:
+            _set_text(t, new_text)
+
+def replace_placeholders(doc, replacements):
+    # single pass over every candidate paragraph: each {{Name}} token found is looked up in
+    # `replacements`, tokens without a replacement (e.g. {{ScenarioTable}}) are left alone.
+    values = {k: str(v) for k, v in replacements.items()}
+    for part in _text_parts(doc):
+        for p in _CANDIDATE_PARAGRAPHS(part.element):
+            _replace_in_text_nodes(_own_text_nodes(p), values)
+
+def replace_in_paragraph(paragraph, replacements):
+    # same run-preserving substitution, limited to one python-docx Paragraph
+    _replace_in_text_nodes(_own_text_nodes(paragraph._p), {k: str(v) for k, v in replacements.items()})
+
+def find_paragraph_with_placeholder(doc, placeholder):
+    # first paragraph (body in document order, then headers/footers) containing `placeholder`
+    for part in _text_parts(doc):
+        found = _PARAGRAPHS_CONTAINING(part.element, text=placeholder)
+        if found:
+            return Paragraph(found[0], doc)
+    return None
+
+def table_layout(doc, ncols, preferred_style_name="Table Grid"):
+    # (table style id, column width in twips) resolved the way doc.add_table() + table.style would:
+    # columns share the last section's text width; an unknown style name means no style
+    try:
+        style_id = doc.styles.get_style_id(preferred_style_name, WD_STYLE_TYPE.TABLE)
+    except (KeyError, ValueError):
+        style_id = None
+    section = doc.sections[-1]
+    block_width = section.page_width - section.left_margin - section.right_margin
+    return style_id, Emu(block_width // ncols).twips
+
+def table_xml(rows, ncols, col_width, style_id=None):
+    # same markup python-docx's add_table() emits, with cell text filled in, as one string
+    tc = '<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="%d"/></w:tcPr><w:p><w:r><w:t xml:space="preserve">%%s</w:t></w:r></w:p></w:tc>' % col_width
+    parts = [
+        "<w:tbl %s><w:tblPr>" % nsdecls("w"),
+        '<w:tblStyle w:val="%s"/>' % xml_escape(style_id, {'"': "&quot;"}) if style_id else "",
+        '<w:tblW w:type="auto" w:w="0"/>'
+        '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+        "</w:tblPr><w:tblGrid>",
+        '<w:gridCol w:w="%d"/>' % col_width * ncols,
+        "</w:tblGrid>",
+    ]
+    for row in rows:
+        cells = [xml_escape(str(v)) for v in row][:ncols]
+        cells += [""] * (ncols - len(cells))
+        parts.append("<w:tr>" + "".join(tc % c for c in cells) + "</w:tr>")
+    parts.append("</w:tbl>")
+    return "".join(parts)
+
+def insert_table_xml(doc, paragraph, xml):
+    # parse a prebuilt <w:tbl> once and place it right after `paragraph` -- the table is built
+    # detached, so this is its only tree mutation. paragraph=None appends it at the end of the
+    # body (just before the final sectPr).
+    tbl = parse_xml(xml)
+    if paragraph is not None:
+        paragraph._p.addnext(tbl)
+    else:
+        doc.element.body._insert_tbl(tbl)
+
+def save_docx(doc, template_raw, out):
+    # write `doc` by patching the original upload instead of re-serialising the whole package:
+    # the parts this module edits (document, headers, footers) and their rels are written fresh,
+    # every other zip member (styles, numbering, theme, fonts, media, ...) is copied from the
+    # template. if the package gained parts (or a part gained its first rels file) since it was
+    # loaded, [Content_Types].xml or the zip listing would be stale, so that case falls back to a
+    # regular doc.save().
+    fresh = {}
+    for part in _text_parts(doc):
+        fresh[part.partname.membername] = part.blob
+        if len(part.rels):
+            fresh[part.partname.rels_uri.membername] = part.rels.xml
+    with zipfile.ZipFile(io.BytesIO(template_raw)) as src:
+        members = set(src.namelist())
+        if set(fresh) - members or any(
+            part.partname.membername not in members for part in doc.part.package.iter_parts()
+        ):
+            doc.save(out)
+            return
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+            for info in src.infolist():
+                data = fresh[info.filename] if info.filename in fresh else src.read(info)
+                copy_info = zipfile.ZipInfo(info.filename, info.date_time)
+                copy_info.compress_type = info.compress_type
+                copy_info.external_attr = info.external_attr
+                dst.writestr(copy_info, data)
@@ -0,0 +1,80 @@
+# termsheet/pricing.py (leg payoff kernels used to build the scenario table)
+import numpy as np
+
+# integer codes for the leg types, so the payoff kernels never compare strings
+LEG_KINDS = {"Call": 0, "Put": 1, "Forward": 2}
+
+def legs_to_arrays(legs_list):
+    # list-of-dicts legs -> parallel strike / multiplier / kind arrays (done once, outside the grid loop)
+    n = len(legs_list)
+    strikes = np.fromiter((lg["strike"] for lg in legs_list), dtype=np.float64, count=n)
+    mults = np.fromiter((lg["mult"] for lg in legs_list), dtype=np.float64, count=n)
+    kinds = np.fromiter((LEG_KINDS[lg["type"]] for lg in legs_list), dtype=np.int8, count=n)
+    return strikes, mults, kinds
+
+def _scenario_payoffs_loop(spots, strikes, mults, kinds):
+    # plain loop form: this is what numba compiles, and it doubles as the reference implementation
+    out = np.zeros_like(spots)
+    for i in range(spots.size):
+        s = spots[i]
+        acc = 0.0
+        for j in range(strikes.size):
+            k = kinds[j]
+            if k == 0:
+                acc += mults[j] * max(0.0, s - strikes[j])
+            elif k == 1:
+                acc += mults[j] * max(0.0, strikes[j] - s)
+            else:
+                acc += mults[j] * (s - strikes[j])
+        out[i] = acc
+    return out
+
+def _scenario_payoffs_numpy(spots, strikes, mults, kinds):
+    # branchless: every leg's payoff over the whole grid as one (legs x spots) matrix
+    diff = spots[None, :] - strikes[:, None]
+    kind = kinds[:, None]
+    payoff_mat = np.where(kind == LEG_KINDS["Call"], np.maximum(diff, 0.0),
+                          np.where(kind == LEG_KINDS["Put"], np.maximum(-diff, 0.0), diff))
+    # summed leg by leg in input order rather than mults @ payoff_mat, whose blocked reduction
+    # can move a sum across a cent boundary
+    total = np.zeros_like(spots)
+    for j in range(len(mults)):
+        total += mults[j] * payoff_mat[j]
+    return total
+
+_kernel = None
+
+def _payoff_kernel():
+    # numba takes longer to import than the rest of the app, so -- like the python-docx import in
+    # load_template -- it is deferred to the first payoff evaluation and the jitted loop kept here
+    global _kernel
+    if _kernel is None:
+        try:
+            from numba import njit
+        except ImportError:  # numba is optional; the NumPy kernel is used without it
+            _kernel = _scenario_payoffs_numpy
+        else:
+            _kernel = njit(cache=True)(_scenario_payoffs_loop)
+    return _kernel
+
+def scenario_payoffs(spots, strikes, mults, kinds):
+    # unrounded per-unit payoff at each spot, via the jitted loop when numba is available
+    return _payoff_kernel()(spots, strikes, mults, kinds)
+
+def round_cents(values):
+    # same result as round(v, 2) per value. ndarray.round() rints the *rounded* product v * 100, so it
+    # can only pick the other cent when that product sits within its rounding error of a .5 -- only
+    # those few entries are redone with Python's exact round().
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100.0
+    out = values.round(2)
+    with np.errstate(invalid="ignore"):  # inf - inf for non-finite entries, which are never near a tie
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 2.0 * np.spacing(np.abs(scaled))
+    for i in np.flatnonzero(near_tie):
+        out.flat[i] = round(float(values.flat[i]), 2)
+    return out
+
+def combined_payoff(spots, strikes, mults, kinds):
+    # per-unit payoff of all legs at each spot level; leg arrays come from legs_to_arrays()
+    spots = np.asarray(spots, dtype=np.float64)
+    return round_cents(scenario_payoffs(spots, strikes, mults, kinds))
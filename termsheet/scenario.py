@@ -0,0 +1,18 @@
+# termsheet/scenario.py (spot grid for the scenario table)
+import numpy as np
+
+def spot_grid(start, stop, step, decimals=2):
+    # start, start + step, ... up to and including stop (either direction, step must be non-zero).
+    # each level is start + i * step, so no float drift accumulates along the grid.
+    n = max(int(np.floor((stop - start) / step + 1e-9)) + 1, 0)
+    return (start + step * np.arange(n, dtype=np.float64)).round(decimals)
+
+def format_columns(columns, fmt="%.2f"):
+    # table cell strings as rows. each column is formatted by a single %-operation over a repeated
+    # template and split back into cells, rather than one format call per cell.
+    # adding 0.0 folds -0.0 (e.g. a short leg that is out of the money) into 0.0.
+    cells = []
+    for col in columns:
+        values = (np.asarray(col, dtype=np.float64) + 0.0).tolist()
+        cells.append(((fmt + "\n") * len(values) % tuple(values)).split("\n")[:-1])
+    return [list(row) for row in zip(*cells)]
@@ -0,0 +1,154 @@
+# tests/test_docx_utils.py (run-preserving placeholder replacement and the patched-zip save)
+import io
+import random
+import re
+import struct
+import zipfile
+import zlib
+
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+
+from termsheet.docx_utils import (
+    find_paragraph_with_placeholder, replace_in_paragraph, replace_placeholders, save_docx,
+)
+
+VALUES = {"{{ClientName}}": "Acme  Corp", "{{Strike}}": "105.00", "{{Empty}}": "", "{{Pad}}": " x "}
+
+def paragraph_from_pieces(doc, pieces, bold=None):
+    # one run per piece; bold[i] sets the i-th run's bold flag
+    p = doc.add_paragraph()
+    for i, piece in enumerate(pieces):
+        run = p.add_run(piece)
+        if bold is not None:
+            run.bold = bold[i]
+    return p
+
+def text_of(element):
+    # every <w:t> below `element`, nested text-box paragraphs included
+    return "".join(t.text or "" for t in element.iter(qn("w:t")))
+
+def random_pieces(rng, text):
+    # `text` cut at random offsets, empty runs included
+    cuts = sorted(rng.randint(0, len(text)) for _ in range(rng.randint(0, 8)))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+def random_text(rng):
+    tokens = list(VALUES) + ["{{Unknown}}", "{{", "}}", "{", "}", "{{Strike", "a", " ", "Strike}}"]
+    return "".join(rng.choice(tokens) for _ in range(rng.randint(1, 10)))
+
+def expected_text(text):
+    return re.sub(r"\{\{\w+\}\}", lambda m: VALUES.get(m.group(0), m.group(0)), text)
+
+def test_random_run_splits_match_re_sub():
+    rng = random.Random(20240611)
+    doc = Document()
+    cases = []
+    for _ in range(2000):
+        text = random_text(rng)
+        cases.append((text, paragraph_from_pieces(doc, random_pieces(rng, text))))
+    replace_placeholders(doc, VALUES)
+    for text, p in cases:
+        assert p.text == expected_text(text), text
+
+def test_run_formatting_is_kept():
+    doc = Document()
+    pieces = ["Client: ", "{{Cli", "entName", "}}", " strike ", "{{Strike}}", " end"]
+    bold = [False, True, None, False, True, None, True]
+    p = paragraph_from_pieces(doc, pieces, bold)
+    p.runs[2].italic = True
+    replace_placeholders(doc, VALUES)
+    assert [r.text for r in p.runs] == ["Client: ", "Acme  Corp", "", "", " strike ", "105.00", " end"]
+    assert [r.bold for r in p.runs] == bold
+    assert [r.italic for r in p.runs] == [None, None, True, None, None, None, None]
+
+def test_unknown_placeholder_is_left_alone():
+    doc = Document()
+    p = paragraph_from_pieces(doc, ["{{Unk", "nown}} and {{Strike}} and {{", "ScenarioTable}}"])
+    replace_placeholders(doc, VALUES)
+    assert p.text == "{{Unknown}} and 105.00 and {{ScenarioTable}}"
+    assert [r.text for r in p.runs] == ["{{Unk", "nown}} and 105.00 and {{", "ScenarioTable}}"]
+
+def test_placeholder_inside_text_box():
+    doc = Document()
+    outer = doc.add_paragraph("before {{Strike}} ")
+    outer._p.append(parse_xml(
+        '<w:r %s><w:pict><v:shape xmlns:v="urn:schemas-microsoft-com:vml"><v:textbox><w:txbxContent>'
+        "<w:p><w:r><w:t>{{Client</w:t></w:r><w:r><w:t>Name}}</w:t></w:r></w:p>"
+        "<w:p><w:r><w:t>{{Scenario</w:t></w:r><w:r><w:t>Table}}</w:t></w:r></w:p>"
+        "</w:txbxContent></v:textbox></v:shape></w:pict></w:r>" % nsdecls("w")
+    ))
+    replace_placeholders(doc, VALUES)
+    inner_client, inner_table = outer._p.xpath(".//w:txbxContent/w:p")
+    assert text_of(inner_client) == "Acme  Corp"
+
+    para = find_paragraph_with_placeholder(doc, "{{ScenarioTable}}")
+    assert para._p is inner_table
+    replace_in_paragraph(para, {"{{ScenarioTable}}": ""})
+    assert text_of(inner_table) == ""
+    assert text_of(outer._p) == "before 105.00 Acme  Corp"
+
+def png_1x1(rgb=b"\x00\xff\x00"):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"\x00" + rgb)) + chunk(b"IEND", b"")
+
+def template_bytes():
+    # header, footer (without a .rels of its own) and an image part, as saved by python-docx
+    doc = Document()
+    section = doc.sections[0]
+    section.header.paragraphs[0].text = "Client: {{ClientName}}"
+    section.footer.paragraphs[0].text = "Strike {{Strike}}"
+    doc.add_paragraph("Dear {{Client").add_run("Name}},")
+    doc.add_picture(io.BytesIO(png_1x1()))
+    doc.add_paragraph("{{ScenarioTable}}")
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+def zip_members(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        return [(name, z.read(name)) for name in z.namelist()]
+
+def save_both_ways(doc, raw, monkeypatch):
+    # (save_docx output, doc.save() output, whether save_docx fell back to doc.save())
+    fallbacks = []
+    real_save = doc.save
+    monkeypatch.setattr(doc, "save", lambda out: fallbacks.append(out) or real_save(out))
+    patched = io.BytesIO()
+    save_docx(doc, raw, patched)
+    saved = io.BytesIO()
+    real_save(saved)
+    return patched.getvalue(), saved.getvalue(), bool(fallbacks)
+
+def test_patched_zip_matches_doc_save(monkeypatch):
+    raw = template_bytes()
+    doc = Document(io.BytesIO(raw))
+    replace_placeholders(doc, VALUES)
+    patched, saved, fell_back = save_both_ways(doc, raw, monkeypatch)
+    assert not fell_back
+    assert zip_members(patched) == zip_members(saved)
+    names = [name for name, _ in zip_members(patched)]
+    assert any(name.startswith("word/media/") for name in names)
+    assert "word/header1.xml" in names and "word/footer1.xml" in names
+    assert b"Acme  Corp" in dict(zip_members(patched))["word/header1.xml"]
+
+def test_new_part_falls_back_to_doc_save(monkeypatch):
+    raw = template_bytes()
+    doc = Document(io.BytesIO(raw))
+    doc.add_picture(io.BytesIO(png_1x1(b"\x00\x00\xff")))
+    patched, saved, fell_back = save_both_ways(doc, raw, monkeypatch)
+    assert fell_back
+    assert zip_members(patched) == zip_members(saved)
+
+def test_first_rels_file_falls_back_to_doc_save(monkeypatch):
+    raw = template_bytes()
+    assert "word/_rels/footer1.xml.rels" not in dict(zip_members(raw))
+    doc = Document(io.BytesIO(raw))
+    doc.sections[0].footer.part.relate_to("https://example.com/", RT.HYPERLINK, is_external=True)
+    patched, saved, fell_back = save_both_ways(doc, raw, monkeypatch)
+    assert fell_back
+    assert "word/_rels/footer1.xml.rels" in dict(zip_members(patched))
@@ -0,0 +1,60 @@
+# tests/test_pricing.py (payoff kernels against the original per-spot scalar loop)
+import numpy as np
+import pytest
+
+from termsheet import pricing
+from termsheet.pricing import LEG_KINDS, combined_payoff, legs_to_arrays
+
+def baseline_combined_payoff(spot_val, legs_list):
+    # the scalar implementation the scenario table used before the kernels existed
+    total = 0.0
+    for lg in legs_list:
+        if lg["type"] == "Call":
+            total += lg["mult"] * max(0.0, spot_val - lg["strike"])
+        elif lg["type"] == "Put":
+            total += lg["mult"] * max(0.0, lg["strike"] - spot_val)
+        elif lg["type"] == "Forward":
+            total += lg["mult"] * (spot_val - lg["strike"])
+    return round(total, 2)
+
+def random_cases(n_cases=200, seed=1234):
+    # 1-dp strikes and spots, 2-dp multipliers: the inputs the app's number widgets produce
+    rng = np.random.default_rng(seed)
+    kinds = list(LEG_KINDS)
+    for _ in range(n_cases):
+        n_legs = int(rng.integers(1, 6))
+        legs = [
+            {"type": kinds[int(rng.integers(len(kinds)))],
+             "strike": round(float(rng.uniform(40.0, 110.0)), 1),
+             "mult": round(float(rng.uniform(-2.0, 2.0)), 2)}
+            for _ in range(n_legs)
+        ]
+        spots = np.round(rng.uniform(30.0, 130.0, 64), 1)
+        yield legs, spots
+
+def expected(legs, spots):
+    return np.array([baseline_combined_payoff(s, legs) for s in spots.tolist()])
+
+KERNELS = {
+    "scenario_payoffs": lambda: pricing.scenario_payoffs,
+    "numpy": lambda: pricing._scenario_payoffs_numpy,
+    "loop": lambda: pricing._scenario_payoffs_loop,
+}
+
+@pytest.mark.parametrize("name", list(KERNELS))
+def test_kernels_match_baseline(name):
+    kernel = KERNELS[name]()
+    for legs, spots in random_cases():
+        got = pricing.round_cents(kernel(spots, *legs_to_arrays(legs)))
+        np.testing.assert_array_equal(got, expected(legs, spots))
+
+def test_jitted_kernel_matches_baseline():
+    numba = pytest.importorskip("numba")
+    kernel = numba.njit(cache=True)(pricing._scenario_payoffs_loop)
+    for legs, spots in random_cases():
+        got = pricing.round_cents(kernel(spots, *legs_to_arrays(legs)))
+        np.testing.assert_array_equal(got, expected(legs, spots))
+
+def test_combined_payoff_matches_baseline():
+    for legs, spots in random_cases():
+        np.testing.assert_array_equal(combined_payoff(spots, *legs_to_arrays(legs)), expected(legs, spots))